@@ -2,6 +2,7 @@ import os
 import pandas as pd
 import numpy as np
 from flask import Flask, render_template, request, jsonify, send_from_directory
+from flask.json.provider import DefaultJSONProvider
 from dotenv import load_dotenv
 
 from langchain_community.document_loaders import TextLoader
@@ -9,28 +10,134 @@ from langchain_openai import OpenAIEmbeddings
 from langchain_text_splitters import CharacterTextSplitter
 from langchain_pinecone import PineconeVectorStore
 from pinecone import Pinecone
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+import random
+import threading
 import time
 
+from src.data.data_processor import TONE_COLUMNS, DataProcessor
+from src.vector_search.vector_search import (
+    EMBEDDING_BATCH_SIZE, EMBEDDING_CACHE_SIZE, top_k_positions
+)
+
 # Load environment variables
 load_dotenv()
 
+# JSON provider that also serializes NumPy scalars (e.g. float32 emotion scores),
+# so values taken straight from the catalog never need a per-value cast
+class NumpyJSONProvider(DefaultJSONProvider):
+    @staticmethod
+    def default(o):
+        if isinstance(o, np.generic):
+            return o.item()
+        return DefaultJSONProvider.default(o)
+
 app = Flask(__name__)
+app.json = NumpyJSONProvider(app)
 
-# Load books data
-books = pd.read_csv("books_with_emotions.csv")
-books["large_thumbnail"] = books["thumbnail"] + "&fife=w800"
-books["large_thumbnail"] = np.where(
-    books["large_thumbnail"].isna(),
-    "cover-not-found.jpg",
-    books["large_thumbnail"],
-)
+# Resolve data file locations once, relative to this file rather than the working directory
+DATA_DIR = Path(__file__).parent.resolve()
+BOOKS_PATH = DATA_DIR / "books_with_emotions.csv"
+DESCRIPTIONS_PATH = DATA_DIR / "tagged_description.txt"
+STATIC_DIR = DATA_DIR / "static"
+
+# Catalog columns the app uses; the rest of the file is never loaded
+BOOK_COLUMNS = [
+    "isbn13", "title", "authors", "description", "thumbnail", "simple_categories",
+    "joy", "anger", "sadness", "fear", "surprise",
+]
+
+# Load books data through DataProcessor, which memory-maps its cached Arrow copy of the
+# CSV (and rebuilds the copy whenever the CSV is newer)
+data_processor = DataProcessor(str(DATA_DIR))
+books = data_processor.load_data(BOOKS_PATH.name, columns=BOOK_COLUMNS)
+# isbn13 is kept as a string column so it matches ISBNs parsed from search results as-is
+books["isbn13"] = books["isbn13"].astype("string")
+# Large cover URL, or the placeholder image for books without a thumbnail
+books = data_processor.prepare_for_web_display(books)
+
+# Categorical dtype stores each category once and compares small integer codes
+books["simple_categories"] = books["simple_categories"].astype("category")
+
+# Map each ISBN to its catalog row once so each query is a hash lookup instead of a full scan
+ISBN_TO_ROW = {isbn: row for row, isbn in enumerate(books["isbn13"])}
+
+# Boolean row mask of the catalog for each category, so filtering is a NumPy gather
+CATEGORY_MASKS = {
+    category: (books["simple_categories"] == category).to_numpy()
+    for category in books["simple_categories"].cat.categories
+}
+
+# Emotion columns in tone order (TONE_COLUMNS maps each tone option to its column)
+EMOTION_COLUMNS = list(TONE_COLUMNS.values())
 
-# Convert isbn13 to string type to ensure matching works properly
-books['isbn13'] = books['isbn13'].astype(str)
+# Emotion scores as one contiguous float32 matrix (one row per book, in catalog order)
+# so tone ranking works on a plain NumPy column instead of a pandas sort
+EMOTION_MATRIX = books[EMOTION_COLUMNS].to_numpy(dtype=np.float32)
+
+# Output key for each column returned by /recommend
+RESULT_COLUMNS = {
+    "isbn13": "isbn13",
+    "title": "title",
+    "authors_str": "authors",
+    "truncated_description": "description",
+    "description": "full_description",
+    "large_thumbnail": "thumbnail",
+    "simple_categories": "categories",
+    "publication_date": "publication_date",
+}
+# Emotion scores returned by /recommend, in response order
+RESULT_EMOTIONS = ["joy", "anger", "sadness", "fear", "surprise"]
 
 # Define the index name for Pinecone
 INDEX_NAME = os.environ.get("PINECONE_INDEX_NAME", "book-recommendations")
 
+# Number of vectors per Pinecone upsert request, keeps each message under the size limit
+UPSERT_BATCH_SIZE = 100
+# Number of batches embedded and upserted concurrently during the index build
+EMBEDDING_WORKERS = 5
+# Attempts per batch before it is reported as failed
+BATCH_ATTEMPTS = 3
+
+# Metadata stored with each vector in the index
+def document_metadata(text):
+    # PineconeVectorStore reads the document text back from the "text" metadata key
+    metadata = {"text": text}
+    # Store the ISBN so query results can be matched without parsing the text
+    isbn = safe_extract_isbn(text)
+    if isbn is not None:
+        metadata["isbn13"] = isbn
+        # Store the category so searches can filter by it inside the index
+        row = ISBN_TO_ROW.get(isbn)
+        if row is not None:
+            metadata["simple_categories"] = str(books["simple_categories"].iat[row])
+    return metadata
+
+# Embed one batch of texts and upsert it into the index, retrying on failure
+def embed_and_upsert(index, embeddings, start, texts):
+    # Stagger the workers a little so they don't hit the rate limit all at once
+    time.sleep(random.uniform(0, 0.2))
+    
+    for attempt in range(1, BATCH_ATTEMPTS + 1):
+        try:
+            vectors = embeddings.embed_documents(texts)
+            index.upsert(
+                vectors=[
+                    (str(start + offset), vector, document_metadata(text))
+                    for offset, (vector, text) in enumerate(zip(vectors, texts))
+                ],
+                batch_size=UPSERT_BATCH_SIZE,
+            )
+            return len(vectors)
+        except Exception as e:
+            if attempt == BATCH_ATTEMPTS:
+                raise
+            print(f"Error processing chunks {start}-{start+len(texts)-1} (attempt {attempt}): {e}")
+            # Back off with jitter so a rate-limited batch doesn't retry in lockstep with the others
+            time.sleep(2 ** attempt + random.uniform(0, 1))
+
 # Setup embeddings and database
 def setup_db():
     # Initialize Pinecone
@@ -41,83 +148,185 @@ def setup_db():
         print(f"Index {INDEX_NAME} not found. Please create it in the Pinecone dashboard.")
     
     # Create the embedding model
-    embeddings = OpenAIEmbeddings()
+    # The client retries rate-limited requests with backoff, so no manual sleeps are needed
+    embeddings = OpenAIEmbeddings(chunk_size=EMBEDDING_BATCH_SIZE, max_retries=6)
     
     # Check if the index is empty
     index = pc.Index(INDEX_NAME)
     stats = index.describe_index_stats()
     vector_count = stats['total_vector_count']
     
-    if vector_count > 0:
-        print(f"Loading existing embeddings from Pinecone ({vector_count} vectors)...")
-        # Connect to the existing database
-        db_books = PineconeVectorStore(
-            index_name=INDEX_NAME,
-            embedding=embeddings
-        )
-    else:
+    if vector_count == 0:
         print("Creating new embeddings database...")
         # Create and persist a new database
         # Use UTF-8 encoding to handle special characters
-        raw_documents = TextLoader("tagged_description.txt", encoding="utf-8").load()
+        raw_documents = TextLoader(str(DESCRIPTIONS_PATH), encoding="utf-8").load()
         # Important: Keep the same chunking settings as in the Chroma version
         text_splitter = CharacterTextSplitter(separator="\n", chunk_size=0, chunk_overlap=0)
         documents = text_splitter.split_documents(raw_documents)
         
         print(f"Split into {len(documents)} chunks")
         
-        # Process in batches to avoid hitting message size limits
-        batch_size = 50
-        total_batches = (len(documents) + batch_size - 1) // batch_size
+        # Embed and upsert large batches, several in flight at a time
+        batches = [
+            (i, [doc.page_content for doc in documents[i:i + EMBEDDING_BATCH_SIZE]])
+            for i in range(0, len(documents), EMBEDDING_BATCH_SIZE)
+        ]
+        # Upserted vector counts, kept in the original batch order
+        upserted = [0] * len(batches)
         
-        for i in range(0, len(documents), batch_size):
-            end_idx = min(i + batch_size, len(documents))
-            current_batch = documents[i:end_idx]
-            print(f"Processing batch {(i//batch_size)+1}/{total_batches} (chunks {i}-{end_idx-1})...")
-            
-            try:
-                if i == 0:
-                    # First batch - create vector store
-                    db_books = PineconeVectorStore.from_documents(
-                        current_batch,
-                        embeddings,
-                        index_name=INDEX_NAME
-                    )
-                else:
-                    # Subsequent batches - add to existing store
-                    db_books.add_documents(current_batch)
-                
-                # Add a small delay between batches to avoid rate limits
-                time.sleep(1)
-            except Exception as e:
-                print(f"Error processing batch: {e}")
-                # If error occurs on first batch, raise it
-                if i == 0:
-                    raise e
-                # Otherwise continue with next batch
-                time.sleep(2)
-                continue
+        with ThreadPoolExecutor(max_workers=EMBEDDING_WORKERS) as executor:
+            futures = {
+                executor.submit(embed_and_upsert, index, embeddings, start, texts): batch_index
+                for batch_index, (start, texts) in enumerate(batches)
+            }
+            for future in as_completed(futures):
+                batch_index = futures[future]
+                start, texts = batches[batch_index]
+                try:
+                    upserted[batch_index] = future.result()
+                    print(f"Processed batch {batch_index+1}/{len(batches)} (chunks {start}-{start+len(texts)-1})")
+                except Exception as e:
+                    # A failed batch doesn't stop the others
+                    print(f"Error processing batch {batch_index+1}/{len(batches)}: {e}")
+        
+        # If nothing made it into the index there is nothing to serve
+        if not any(upserted):
+            raise RuntimeError(f"Failed to build the {INDEX_NAME} index")
+    else:
+        print(f"Loading existing embeddings from Pinecone ({vector_count} vectors)...")
+    
+    # Connect to the database
+    db_books = PineconeVectorStore(
+        index_name=INDEX_NAME,
+        embedding=embeddings
+    )
     
     return db_books
 
 # Helper function to safely extract ISBN from text
 def safe_extract_isbn(text):
-    try:
-        # Extract first token from text which should be the ISBN
-        isbn_text = text.strip('"').split()[0]
-        
-        # Return the ISBN as a string to match the dataframe's data type
-        return str(isbn_text)
-    except (ValueError, IndexError):
+    # The ISBN is the first token; partition stops at the first space instead of
+    # splitting the whole description into a throwaway list
+    isbn_text = text.lstrip('" ').partition(" ")[0].rstrip('"')
+    
+    if not isbn_text:
         # If we can't parse the ISBN, return None
         print(f"Warning: Could not extract ISBN from: {text[:50]}...")
         return None
+    
+    # The ISBN is already a string, matching the dataframe's data type
+    return isbn_text
+
+# Most queries accepted by a single /recommend_batch request
+MAX_BATCH_QUERIES = 32
+# Number of past queries kept in the semantic query cache
+QUERY_CACHE_SIZE = 256
+# Cosine similarity above which two queries are treated as the same request
+QUERY_CACHE_THRESHOLD = 0.97
+
+# LRU cache of recommendation results keyed by query embedding and filters.
+# A lookup hits when a cached query with the same filters is within QUERY_CACHE_THRESHOLD
+# cosine similarity, so repeated and near-duplicate queries skip the vector database.
+# Cached DataFrames are shared between requests and must not be modified in place.
+class SemanticQueryCache:
+    def __init__(self, capacity=QUERY_CACHE_SIZE, threshold=QUERY_CACHE_THRESHOLD):
+        self.capacity = capacity
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        # Unit-length query embeddings, one row per slot, allocated on first insert
+        self._keys = None
+        self._filters = [None] * capacity
+        self._results = [None] * capacity
+        self._last_used = np.zeros(capacity, dtype=np.int64)
+        self._clock = 0
+        self._size = 0
+    
+    @staticmethod
+    def _normalize(embedding):
+        embedding = np.asarray(embedding, dtype=np.float32)
+        return embedding / (np.linalg.norm(embedding) or 1.0)
+    
+    def get(self, embedding, filters):
+        query = self._normalize(embedding)
+        with self._lock:
+            if self._size == 0:
+                return None
+            # One matrix-vector product scores the query against every cached key
+            similarities = self._keys[:self._size] @ query
+            # Try the closest keys first until one with the same filters is found
+            for slot in np.argsort(-similarities):
+                if similarities[slot] < self.threshold:
+                    break
+                if self._filters[slot] == filters:
+                    self._clock += 1
+                    self._last_used[slot] = self._clock
+                    return self._results[slot]
+        return None
+    
+    def put(self, embedding, filters, result):
+        key = self._normalize(embedding)
+        with self._lock:
+            if self._keys is None:
+                self._keys = np.zeros((self.capacity, key.shape[0]), dtype=np.float32)
+            if self._size < self.capacity:
+                slot = self._size
+                self._size += 1
+            else:
+                # Evict the least recently used entry
+                slot = int(np.argmin(self._last_used))
+            self._clock += 1
+            self._keys[slot] = key
+            self._filters[slot] = filters
+            self._results[slot] = result
+            self._last_used[slot] = self._clock
 
 # Initialize the database
 db_books = setup_db()
+query_cache = SemanticQueryCache()
+
+# LRU cache of query embeddings by exact query text, shared by single and batch requests
+embedding_cache = OrderedDict()
+embedding_cache_lock = threading.Lock()
+
+# Helper function to look up a cached query embedding, None if it isn't cached
+def cached_embedding(query):
+    with embedding_cache_lock:
+        embedding = embedding_cache.get(query)
+        if embedding is not None:
+            embedding_cache.move_to_end(query)
+        return embedding
+
+# Helper function to cache a query embedding, evicting the least recently used one when full
+def cache_embedding(query, embedding):
+    with embedding_cache_lock:
+        embedding_cache[query] = embedding
+        embedding_cache.move_to_end(query)
+        if len(embedding_cache) > EMBEDDING_CACHE_SIZE:
+            embedding_cache.popitem(last=False)
+
+# Helper function to embed a query, reusing the embedding when the same text comes in again
+def embed_query(query):
+    embedding = cached_embedding(query)
+    if embedding is None:
+        # A tuple keeps the cached embedding immutable
+        embedding = tuple(db_books.embeddings.embed_query(query))
+        cache_embedding(query, embedding)
+    return embedding
+
+# Helper function to embed several distinct queries, sending only the ones not cached yet
+# in a single embeddings request
+def embed_queries(queries):
+    embeddings = {query: cached_embedding(query) for query in queries}
+    missing = [query for query, embedding in embeddings.items() if embedding is None]
+    if missing:
+        for query, embedding in zip(missing, db_books.embeddings.embed_documents(missing)):
+            embeddings[query] = tuple(embedding)
+            cache_embedding(query, embeddings[query])
+    return embeddings
 
 # Get all unique categories
-categories = ["All"] + sorted(books["simple_categories"].unique().tolist())
+categories = ["All"] + sorted(books["simple_categories"].cat.categories.tolist())
 tones = ["All", "Happy", "Surprising", "Angry", "Suspenseful", "Sad"]
 
 def retrieve_semantic_recommendations(
@@ -126,65 +335,138 @@ def retrieve_semantic_recommendations(
         tone: str = None,
         initial_top_k: int = 100,  # Increased from 50 to get more potential matches
         final_top_k: int = 16,
+        query_embedding: list = None,
 ) -> pd.DataFrame:
 
-    # Get semantic search results
-    recs = db_books.similarity_search(query, k=initial_top_k)
+    # Embed the query once (unless a batch already did); the embedding drives both
+    # the cache lookup and the search
+    if query_embedding is None:
+        query_embedding = list(embed_query(query))
+    filters = (category, tone, initial_top_k, final_top_k)
+    
+    book_recs = query_cache.get(query_embedding, filters)
+    if book_recs is not None:
+        print(f"Query cache hit for '{query}'")
+        return book_recs
+    
+    book_recs = search_recommendations(
+        query, query_embedding, category, tone, initial_top_k, final_top_k
+    )
+    if not book_recs.empty:
+        query_cache.put(query_embedding, filters, book_recs)
+    
+    return book_recs
+
+def search_recommendations(
+        query: str,
+        query_embedding: list,
+        category: str,
+        tone: str,
+        initial_top_k: int,
+        final_top_k: int,
+) -> pd.DataFrame:
+
+    recs = []
+    if category != "All":
+        # Let the index return only books in the category, so no matches are wasted on
+        # other categories. Without a tone the nearest final_top_k books are the result;
+        # with one, fetch as many candidates as an unfiltered search so the tone ranking
+        # picks from the same number of books whether or not a category is set
+        k = initial_top_k if tone in TONE_COLUMNS else final_top_k
+        recs = db_books.similarity_search_by_vector(
+            query_embedding, k=k, filter={"simple_categories": {"$eq": category}}
+        )
+    if not recs:
+        # Get semantic search results (also covers indexes built without category metadata,
+        # which the category filter below still handles)
+        recs = db_books.similarity_search_by_vector(query_embedding, k=initial_top_k)
     
     # Extract ISBNs with error handling
     books_list = []
     for rec in recs:
-        isbn = safe_extract_isbn(rec.page_content)
+        # Indexes built by setup_db store the ISBN as metadata; older ones only have the text
+        isbn = rec.metadata.get("isbn13") or safe_extract_isbn(rec.page_content)
         if isbn is not None:
             books_list.append(isbn)
     
+    # Several chunks can point at the same book; keep the first (best-ranked) hit
+    books_list = list(dict.fromkeys(books_list))
+    
     print(f"Query: '{query}', Found {len(books_list)} potential ISBNs")
     
-    # Filter book recommendations - ensure we get books
-    book_recs = books[books["isbn13"].isin(books_list)]
+    # Look up the catalog row of each recommended book, dropping ISBNs that aren't in the catalog
+    # The rows stay in similarity order, so the filters below keep the best matches
+    rows = np.array([ISBN_TO_ROW[isbn] for isbn in books_list if isbn in ISBN_TO_ROW], dtype=np.intp)
     
     # If no books found, print debug info
-    if len(book_recs) == 0:
+    if len(rows) == 0:
         print(f"No books found for query: {query}")
         print(f"ISBNs extracted: {books_list[:10]}...")
         # Debug: Print a sample of ISBNs from the database for comparison
         print(f"Sample ISBNs in database: {books['isbn13'].head(5).tolist()}")
         return pd.DataFrame()  # Return empty dataframe
     
-    print(f"Found {len(book_recs)} matching books in database")
+    print(f"Found {len(rows)} matching books in database")
     
     # Apply category filter if specified
-    if category != "All" and not book_recs.empty:
-        category_filtered = book_recs[book_recs["simple_categories"] == category]
+    if category != "All":
+        category_mask = CATEGORY_MASKS.get(category)
+        category_rows = rows[category_mask[rows]] if category_mask is not None else rows[:0]
         # Only use the category filter if it didn't filter out all books
-        if not category_filtered.empty:
-            book_recs = category_filtered
-            print(f"After category filter '{category}': {len(book_recs)} books")
+        if len(category_rows) > 0:
+            rows = category_rows
+            print(f"After category filter '{category}': {len(rows)} books")
         else:
             print(f"Category filter '{category}' would remove all books, ignoring filter")
 
-    # Limit to final_top_k books
-    book_recs = book_recs.head(final_top_k)
-    
-    # Sort by emotional tone if specified
-    if not book_recs.empty:
-        if tone == "Happy":
-            book_recs.sort_values(by="joy", ascending=False, inplace=True)
-        elif tone == "Surprising":
-            book_recs.sort_values(by="surprise", ascending=False, inplace=True)
-        elif tone == "Angry":
-            book_recs.sort_values(by="anger", ascending=False, inplace=True)
-        elif tone == "Suspenseful":
-            book_recs.sort_values(by="fear", ascending=False, inplace=True)
-        elif tone == "Sad":
-            book_recs.sort_values(by="sadness", ascending=False, inplace=True)
+    # Limit to final_top_k books: the ones scoring highest for the emotional tone
+    # among all the candidates if one is specified (ties keep their similarity order),
+    # otherwise the most similar ones
+    if tone in TONE_COLUMNS:
+        scores = EMOTION_MATRIX[rows, EMOTION_COLUMNS.index(TONE_COLUMNS[tone])]
+        rows = rows[top_k_positions(scores, final_top_k)]
+    else:
+        rows = rows[:final_top_k]
+
+    # Gather the selected books in a single step
+    book_recs = books.iloc[rows]
 
     return book_recs
 
+# Helper function to turn recommended books into the JSON payload
+def format_recommendations(recommendations):
+    # Debug output for empty results
+    if recommendations.empty:
+        print("No recommendations found!")
+        return []
+    
+    # Format authors and descriptions for the whole result set at once
+    # (assign returns a new frame, so cached results are left untouched)
+    recommendations = recommendations.assign(
+        authors_str=data_processor.format_author_series(recommendations["authors"]),
+        truncated_description=(
+            recommendations["description"].str.split(n=30).str[:30].str.join(" ") + "..."
+        ),
+    )
+    
+    # Build the payload straight from the needed columns, renamed to their output keys.
+    # The catalog has no publication_date column, so reindex fills it in as empty
+    results = (
+        recommendations.reindex(columns=list(RESULT_COLUMNS) + RESULT_EMOTIONS)
+        .fillna({"publication_date": ""})
+        .rename(columns=RESULT_COLUMNS)
+        .to_dict(orient="records")
+    )
+    # Nest the emotion scores under emotional_tones
+    for result in results:
+        result["emotional_tones"] = {column: result.pop(column) for column in RESULT_EMOTIONS}
+    
+    return results
+
 @app.route('/')
 def index():
     # Serve the index.html file from the static directory
-    return send_from_directory('static', 'index.html')
+    return send_from_directory(STATIC_DIR, 'index.html')
 
 @app.route('/categories')
 def get_categories():
@@ -201,47 +483,37 @@ def recommend():
     print(f"Processing recommendation request: query='{query}', category='{category}', tone='{tone}'")
     
     recommendations = retrieve_semantic_recommendations(query, category, tone)
-    
-    # Debug output for empty results
-    if recommendations.empty:
-        print("No recommendations found!")
-        return jsonify({"recommendations": []})
-    
-    # Format the results
-    results = []
-    for _, row in recommendations.iterrows():
-        description = row["description"]
-        truncated_desc_split = description.split()
-        truncated_description = " ".join(truncated_desc_split[:30]) + "..."
-
-        authors_split = row["authors"].split(";")
-        if len(authors_split) == 2:
-            authors_str = f"{authors_split[0]} and {authors_split[1]}"
-        elif len(authors_split) > 2:
-            authors_str = f"{', '.join(authors_split[:-1])}, and {authors_split[-1]}"
-        else:
-            authors_str = row["authors"]
-            
-        results.append({
-            "isbn13": row["isbn13"],
-            "title": row["title"],
-            "authors": authors_str,
-            "description": truncated_description,
-            "full_description": description,
-            "thumbnail": row["large_thumbnail"],
-            "categories": row["simple_categories"],
-            "publication_date": row.get("publication_date", ""),
-            "emotional_tones": {
-                "joy": float(row.get("joy", 0)),
-                "anger": float(row.get("anger", 0)),
-                "sadness": float(row.get("sadness", 0)),
-                "fear": float(row.get("fear", 0)),
-                "surprise": float(row.get("surprise", 0))
-            }
-        })
+    results = format_recommendations(recommendations)
     
     print(f"Returning {len(results)} recommendations")
     return jsonify({"recommendations": results})
 
+@app.route('/recommend_batch', methods=['POST'])
+def recommend_batch():
+    data = request.get_json()
+    queries = data.get('queries')
+    category = data.get('category', 'All')
+    tone = data.get('tone', 'All')
+    
+    if not isinstance(queries, list) or not all(isinstance(query, str) for query in queries):
+        return jsonify({"error": "queries must be a list of strings"}), 400
+    if len(queries) > MAX_BATCH_QUERIES:
+        return jsonify({"error": f"at most {MAX_BATCH_QUERIES} queries per request"}), 400
+    
+    print(f"Processing batch recommendation request: {len(queries)} queries, category='{category}', tone='{tone}'")
+    
+    # Repeated queries are answered once, and the distinct ones are embedded together.
+    # Blank queries have nothing to search for, so they get no recommendations
+    unique_queries = [query for query in dict.fromkeys(queries) if query.strip()]
+    embeddings = embed_queries(unique_queries) if unique_queries else {}
+    results = {
+        query: format_recommendations(retrieve_semantic_recommendations(
+            query, category, tone, query_embedding=list(embeddings[query])
+        ))
+        for query in unique_queries
+    }
+    
+    return jsonify({"recommendations": [results.get(query, []) for query in queries]})
+
 if __name__ == '__main__':
     app.run(debug=True) 
\ No newline at end of file
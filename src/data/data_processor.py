@@ -4,9 +4,64 @@ This module handles data loading, cleaning, and preprocessing for the book recom
 """
 
 import pandas as pd
-import numpy as np
 import os
-from typing import Optional, List, Dict, Any, Union
+import tempfile
+import pyarrow as pa
+from pyarrow import csv as pa_csv
+from pyarrow import feather
+from typing import Callable, Optional, List, Dict, Any, Union
+
+
+# String columns that repeat a few values, stored as categoricals
+CATEGORICAL_COLUMNS = ["simple_categories", "authors"]
+
+# Emotion probabilities, which don't need more than float32 precision
+FLOAT32_COLUMNS = ["anger", "disgust", "fear", "joy", "sadness", "surprise", "neutral"]
+
+# CSV files larger than this are parsed with pyarrow's multi-threaded reader; for
+# smaller files the thread start-up costs more than it saves
+PYARROW_CSV_MIN_BYTES = 50 << 20
+
+# Emotion column used to rank each tone
+TONE_COLUMNS = {
+    "Happy": "joy",
+    "Surprising": "surprise",
+    "Angry": "anger",
+    "Suspenseful": "fear",
+    "Sad": "sadness"
+}
+
+
+def is_fresh(cache_path: str, source_path: str) -> bool:
+    """Check whether a cache file exists and is not older than its source file."""
+    if not os.path.exists(cache_path):
+        return False
+    if not os.path.exists(source_path):
+        return True
+    return os.path.getmtime(cache_path) >= os.path.getmtime(source_path)
+
+
+def write_atomically(path: str, write: Callable[[str], None]) -> None:
+    """Write a file under a temporary name and rename it into place.
+    
+    The temporary name is unique to this writer, so another process never reads a
+    partially written file, even when several workers write the same file at once.
+    If writing fails, the temporary file is removed.
+    
+    Args:
+        path: Path of the file to write.
+        write: Function that writes the file contents to the path it is given.
+    """
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(path), prefix=os.path.basename(path) + ".", suffix=".tmp"
+    )
+    os.close(fd)
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
 
 
 class DataProcessor:
@@ -25,20 +80,110 @@ class DataProcessor:
         """
         self.data_path = data_path or os.getcwd()
         self.books_df = None
+        self.books_table = None  # Arrow table backing books_df when loaded from the Arrow copy
     
-    def load_data(self, file_name: str = "books_cleaned.csv") -> pd.DataFrame:
+    def load_data(self,
+                  file_name: str = "books_cleaned.csv",
+                  columns: Optional[List[str]] = None) -> pd.DataFrame:
         """Load book data from a CSV file.
         
+        The CSV is cached as an uncompressed Arrow IPC copy next to it (same name,
+        .arrow extension). While that copy is at least as new as the CSV it is
+        memory-mapped instead, which skips CSV parsing and keeps the stored dtypes.
+        Numeric columns then point straight at the mapped pages, which the OS
+        shares between every worker process loading the same file. Otherwise the
+        CSV is parsed and the copy is (re)written.
+        
         Args:
             file_name: Name of the CSV file containing book data.
+            columns: Columns to load. If None, loads all columns. Skipping unused
+                     columns saves parsing time and memory.
             
         Returns:
             DataFrame containing book data.
         """
         file_path = os.path.join(self.data_path, file_name)
-        self.books_df = pd.read_csv(file_path)
+        arrow_path = os.path.splitext(file_path)[0] + ".arrow"
+        
+        if is_fresh(arrow_path, file_path):
+            with pa.memory_map(arrow_path, "r") as source:
+                table = pa.ipc.open_file(source).read_all()
+            if columns is not None:
+                table = table.select(columns)
+            # Keep the table alive, since zero-copy columns of books_df borrow its memory.
+            # split_blocks stops pandas from consolidating (and so copying) the columns
+            self.books_table = table
+            self.books_df = table.to_pandas(split_blocks=True)
+            return self.books_df
+        
+        # The cache holds every column, so parse the whole CSV once
+        df = self._optimize_dtypes(self._read_csv(file_path))
+        try:
+            self._write_arrow(df, arrow_path)
+        except OSError as e:
+            print(f"Could not cache {file_path} as Arrow: {e}")
+        
+        self.books_table = None
+        self.books_df = df[columns] if columns is not None else df
         return self.books_df
     
+    @staticmethod
+    def _read_csv(file_path: str) -> pd.DataFrame:
+        """Parse a CSV file, using pyarrow's multi-threaded parser for large files.
+        
+        Args:
+            file_path: Path of the CSV file.
+            
+        Returns:
+            DataFrame containing the parsed data.
+        """
+        if os.path.getsize(file_path) <= PYARROW_CSV_MIN_BYTES:
+            return pd.read_csv(file_path)
+        
+        # Dictionary-encoded columns convert straight to pandas categoricals. Empty
+        # fields become nulls (NaN), as they do with pd.read_csv
+        convert_options = pa_csv.ConvertOptions(
+            column_types={column: pa.dictionary(pa.int32(), pa.string()) for column in CATEGORICAL_COLUMNS},
+            strings_can_be_null=True
+        )
+        return pa_csv.read_csv(file_path, convert_options=convert_options).to_pandas()
+    
+    @staticmethod
+    def _optimize_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+        """Shrink the in-memory footprint of freshly parsed book data.
+        
+        Emotion scores are downcast to float32 and repeated string columns become
+        categoricals, whose equality filters compare integer codes. ISBN13 values
+        need 64 bits and ratings are shown to users, so both are left as they are.
+        
+        Args:
+            df: DataFrame to convert. Columns are converted in place.
+            
+        Returns:
+            The converted DataFrame.
+        """
+        for column in FLOAT32_COLUMNS:
+            if column in df.columns:
+                df[column] = pd.to_numeric(df[column], downcast="float")
+        
+        for column in CATEGORICAL_COLUMNS:
+            if column in df.columns:
+                df[column] = df[column].astype("category")
+        
+        return df
+    
+    @staticmethod
+    def _write_arrow(df: pd.DataFrame, arrow_path: str) -> None:
+        """Write a DataFrame as an uncompressed Arrow IPC file, so it can be memory-mapped.
+        
+        Args:
+            df: DataFrame to write.
+            arrow_path: Path of the Arrow file.
+        """
+        write_atomically(
+            arrow_path, lambda path: feather.write_feather(df, path, compression="uncompressed")
+        )
+    
     def create_tagged_descriptions(self, output_file: str = "tagged_description.txt") -> None:
         """Create a text file with tagged descriptions for vector search.
         
@@ -75,15 +220,11 @@ class DataProcessor:
         if df is None:
             raise ValueError("No data loaded. Call load_data() first.")
         
-        # Create large thumbnail URLs
-        df["large_thumbnail"] = df["thumbnail"] + "&fife=w800"
-        
-        # Handle missing thumbnail URLs
-        df["large_thumbnail"] = np.where(
-            df["large_thumbnail"].isna(),
-            "cover-not-found.jpg",
-            df["large_thumbnail"]
-        )
+        # Create large thumbnail URLs in one pass: missing thumbnails get the
+        # placeholder image and only the rest get the URL suffix appended
+        has_thumbnail = df["thumbnail"].notna()
+        df["large_thumbnail"] = "cover-not-found.jpg"
+        df.loc[has_thumbnail, "large_thumbnail"] = df.loc[has_thumbnail, "thumbnail"] + "&fife=w800"
         
         return df
     
@@ -120,15 +261,7 @@ class DataProcessor:
         if df is None:
             raise ValueError("No data loaded. Call load_data() first.")
         
-        emotion_map = {
-            "Happy": "joy",
-            "Surprising": "surprise",
-            "Angry": "anger",
-            "Suspenseful": "fear",
-            "Sad": "sadness"
-        }
-        
-        column = emotion_map.get(emotion, None)
+        column = TONE_COLUMNS.get(emotion, None)
         if column and column in df.columns:
             return df.sort_values(by=column, ascending=False)
         
@@ -161,8 +294,52 @@ class DataProcessor:
         Returns:
             Truncated description.
         """
-        words = description.split()
+        # Stop splitting after max_words words; the rest of the text stays in one piece
+        words = description.split(maxsplit=max_words)
         if len(words) <= max_words:
             return description
         
-        return " ".join(words[:max_words]) + "..."
\ No newline at end of file
+        return " ".join(words[:max_words]) + "..."
+    
+    def format_author_series(self, authors: pd.Series) -> pd.Series:
+        """Format a column of author strings for display.
+        
+        Vectorized version of format_author_string() that formats the whole column
+        with pandas string operations. Missing authors become empty strings.
+        
+        Args:
+            authors: Series of author names separated by semicolons.
+            
+        Returns:
+            Series of formatted author strings.
+        """
+        authors = authors.astype(object).fillna("")
+        separators = authors.str.count(";")
+        
+        two_authors = authors.str.replace(";", " and ", regex=False)
+        # "A;B;C" -> "A, B, and C": the last separator becomes ", and", the rest ", "
+        many_authors = (
+            authors.str.replace(r";(?=[^;]*$)", ", and ", regex=True)
+            .str.replace(";", ", ", regex=False)
+        )
+        
+        formatted = authors.where(separators == 0, many_authors)
+        return formatted.where(separators != 1, two_authors)
+    
+    def truncate_description_series(self, descriptions: pd.Series, max_words: int = 30) -> pd.Series:
+        """Truncate a column of descriptions to a specified number of words.
+        
+        Vectorized version of truncate_description().
+        
+        Args:
+            descriptions: Series of book descriptions to truncate.
+            max_words: Maximum number of words to include.
+            
+        Returns:
+            Series of truncated descriptions.
+        """
+        descriptions = descriptions.astype(object)
+        # Stop splitting after max_words words; the rest of the text stays in one piece
+        words = descriptions.str.split(n=max_words)
+        truncated = words.str[:max_words].str.join(" ") + "..."
+        return descriptions.where(words.str.len() <= max_words, truncated)
\ No newline at end of file
@@ -4,21 +4,80 @@ This module handles embedding generation and vector search functionality for sem
 """
 
 import os
-from typing import List, Dict, Any, Optional, Union
+from functools import lru_cache
+from typing import List, Optional, Tuple, Union
 
+import numpy as np
 import pandas as pd
-from langchain_community.document_loaders import TextLoader
-from langchain_text_splitters import CharacterTextSplitter
 from langchain_openai import OpenAIEmbeddings
-from langchain_chroma import Chroma
 from dotenv import load_dotenv
 
+from src.data.data_processor import is_fresh, write_atomically
+
+
+# Number of texts per OpenAI embeddings request (the API accepts up to 2048 inputs)
+EMBEDDING_BATCH_SIZE = 1000
+
+# Files holding the int8 description embeddings, their per-row scales and the ISBN13 of each row
+EMBEDDINGS_FILE = "embeddings_int8.npy"
+SCALES_FILE = "embedding_scales.npy"
+ISBNS_FILE = "isbns.npy"
+
+# Dequantized float32 copy of the embeddings that queries are scored against,
+# derived from the int8 file when the database is loaded
+SCORING_FILE = "embeddings_f32.npy"
+
+# Number of query embeddings memoized by exact query text
+EMBEDDING_CACHE_SIZE = 1024
+
+
+def quantize_embeddings(embeddings: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Quantize embeddings to int8 with one scale per row.
+    
+    Args:
+        embeddings: (num_rows, dim) float matrix.
+        
+    Returns:
+        Tuple of the int8 matrix and the float32 scale of each row, such that
+        row * scale approximates the original row.
+    """
+    scales = np.abs(embeddings).max(axis=1) / 127
+    scales[scales == 0] = 1
+    quantized = np.round(embeddings / scales[:, None]).astype(np.int8)
+    return quantized, scales.astype(np.float32)
+
+
+def top_k_positions(scores: np.ndarray, k: int) -> np.ndarray:
+    """Get the positions of the k highest scores, highest first.
+    
+    Args:
+        scores: Scores to rank.
+        k: Number of positions to return.
+        
+    Returns:
+        Positions into scores. Equal scores keep their input order.
+    """
+    if k < len(scores):
+        # Partial selection picks the top k in linear time; sorting them keeps ties in input order
+        positions = np.sort(np.argpartition(-scores, k)[:k])
+    else:
+        positions = np.arange(len(scores))
+    # Only the selected k scores get fully sorted
+    return positions[np.argsort(-scores[positions], kind="stable")]
+
 
 class VectorSearch:
     """Class for performing vector search on book descriptions.
     
     This class provides methods for creating embeddings from book descriptions
     and performing semantic similarity searches.
+    
+    The catalog is only a few thousand books, so the embeddings are kept in a single
+    matrix and searched exactly with matrix-vector products. At this size that is
+    faster than an approximate index and returns the true nearest neighbours. The
+    embeddings are saved as int8 with a per-row scale, a quarter of the size of
+    float32 on disk. Queries are scored against a float32 copy with a single BLAS
+    product, which is faster than converting the int8 rows on every query.
     """
     
     def __init__(self, data_path: Optional[str] = None):
@@ -29,68 +88,272 @@ class VectorSearch:
                        If None, uses the current working directory.
         """
         self.data_path = data_path or os.getcwd()
-        self.db = None
+        self.embeddings = None  # (num_books, dim) float32 matrix of unit-length rows
+        self.isbns = None  # ISBN13 of each embeddings row
+        self.embedding_model = None
+        # Repeated queries reuse their embedding instead of calling the API again
+        self._embed_query = lru_cache(maxsize=EMBEDDING_CACHE_SIZE)(self._compute_query_embedding)
         load_dotenv()  # Load environment variables (for OpenAI API key)
     
+    def _get_embedding_model(self) -> OpenAIEmbeddings:
+        """Return the OpenAI embedding model, creating it on first use."""
+        if self.embedding_model is None:
+            self.embedding_model = OpenAIEmbeddings(chunk_size=EMBEDDING_BATCH_SIZE, max_retries=6)
+        return self.embedding_model
+    
+    def _compute_query_embedding(self, query: str) -> np.ndarray:
+        """Embed a query and normalise it to unit length.
+        
+        Args:
+            query: The search query.
+            
+        Returns:
+            Read-only float32 query embedding.
+        """
+        query_vector = np.asarray(self._get_embedding_model().embed_query(query), dtype=np.float32)
+        query_vector /= np.linalg.norm(query_vector)
+        # Cached arrays are shared between calls, so make sure nobody modifies them
+        query_vector.flags.writeable = False
+        return query_vector
+    
+    def is_ready(self) -> bool:
+        """Return whether the vector database has been created or loaded."""
+        return self.embeddings is not None
+    
     def create_vector_db(self, description_file: str = "tagged_description.txt") -> None:
         """Create a vector database from book descriptions.
         
+        Embeddings saved by a previous run are loaded from disk instead of being
+        recomputed, as long as they are at least as new as the description file.
+        Otherwise they are rebuilt from it.
+        
+        Args:
+            description_file: Name of the file containing tagged book descriptions.
+        """
+        description_path = os.path.join(self.data_path, description_file)
+        saved_paths = [
+            os.path.join(self.data_path, name) for name in (EMBEDDINGS_FILE, SCALES_FILE, ISBNS_FILE)
+        ]
+        if not all(is_fresh(path, description_path) for path in saved_paths):
+            self._build_vector_db(description_file)
+        
+        self.load_vector_db()
+    
+    def load_vector_db(self) -> None:
+        """Load the saved vector database as read-only memory maps.
+        
+        The float32 scoring matrix is (re)derived from the saved int8 embeddings
+        whenever it is missing or older than them. The arrays are paged in from disk
+        on demand and the pages live in the OS page cache, so several worker
+        processes serving the same files share one copy instead of each holding
+        their own.
+        """
+        scoring_path = os.path.join(self.data_path, SCORING_FILE)
+        saved_paths = [os.path.join(self.data_path, name) for name in (EMBEDDINGS_FILE, SCALES_FILE)]
+        if not all(is_fresh(scoring_path, path) for path in saved_paths):
+            quantized, scales = (np.load(path, mmap_mode="r") for path in saved_paths)
+            embeddings = quantized.astype(np.float32) * scales[:, None]
+            write_atomically(scoring_path, lambda path: self._save_array(path, embeddings))
+        
+        self.embeddings = np.load(scoring_path, mmap_mode="r")
+        self.isbns = np.load(os.path.join(self.data_path, ISBNS_FILE), mmap_mode="r")
+        print(f"Vector database loaded with {len(self.isbns)} documents")
+    
+    def preload(self) -> None:
+        """Read the memory-mapped arrays through once so their pages are resident.
+        
+        Otherwise the first searches after start-up fault the pages in from disk.
+        """
+        if self.embeddings is None:
+            raise ValueError("Vector database not created. Call create_vector_db() first.")
+        
+        # Scoring touches every row of the matrix
+        self._score(np.zeros(self.embeddings.shape[1], dtype=np.float32))
+        np.asarray(self.isbns).max()
+    
+    def _build_vector_db(self, description_file: str) -> None:
+        """Embed the tagged book descriptions and save the vector database files.
+        
         Args:
             description_file: Name of the file containing tagged book descriptions.
         """
         file_path = os.path.join(self.data_path, description_file)
         
-        # Load documents
-        raw_documents = TextLoader(file_path).load()
+        # Load documents, one tagged description ("<isbn13> <description>") per line
+        with open(file_path, encoding="utf-8") as f:
+            documents = [line.strip() for line in f if line.strip()]
+        
+        # Only the leading ISBN is needed, so partition at the first space instead of splitting
+        isbns = np.array(
+            [int(doc.lstrip('"').partition(" ")[0]) for doc in documents], dtype=np.int64
+        )
         
-        # Split documents
-        text_splitter = CharacterTextSplitter(chunk_size=0, chunk_overlap=0, separator="\n")
-        documents = text_splitter.split_documents(raw_documents)
+        # Embed all descriptions in batched requests and normalise the rows so that
+        # a dot product with a normalised query is its cosine similarity
+        embeddings = np.asarray(
+            self._get_embedding_model().embed_documents(documents), dtype=np.float32
+        )
+        embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+        embeddings, scales = quantize_embeddings(embeddings)
+        
+        for name, array in ((EMBEDDINGS_FILE, embeddings), (SCALES_FILE, scales), (ISBNS_FILE, isbns)):
+            write_atomically(
+                os.path.join(self.data_path, name), lambda path: self._save_array(path, array)
+            )
         
-        # Create vector database
-        self.db = Chroma.from_documents(documents, OpenAIEmbeddings())
         print(f"Vector database created with {len(documents)} documents")
     
-    def similarity_search(self, query: str, k: int = 50) -> List[Dict[str, Any]]:
+    @staticmethod
+    def _save_array(path: str, array: np.ndarray) -> None:
+        """Save an array in .npy format to exactly the given path."""
+        # np.save appends ".npy" to file names without it, so write through a file object
+        with open(path, "wb") as f:
+            np.save(f, array)
+    
+    def similarity_search(self,
+                          query: str,
+                          k: int = 50,
+                          mask: Optional[np.ndarray] = None) -> List[int]:
         """Perform a similarity search on the vector database.
         
         Args:
             query: The search query.
             k: Number of results to return.
+            mask: Optional boolean array with one entry per stored book (aligned with
+                  self.isbns). Only books where it is True are searched, so filters
+                  are applied before the top k is taken rather than after.
+            
+        Returns:
+            ISBN13 values of the most similar books, most similar first.
+        """
+        isbns, _ = self.similarity_search_with_scores(query, k=k, mask=mask)
+        return isbns
+    
+    def similarity_search_with_scores(self,
+                                      query: str,
+                                      k: int = 50,
+                                      mask: Optional[np.ndarray] = None) -> Tuple[List[int], List[float]]:
+        """Perform a similarity search and also return the similarity of each result.
+        
+        Args:
+            query: The search query.
+            k: Number of results to return.
+            mask: Optional boolean array selecting which stored books to search,
+                  see similarity_search().
             
         Returns:
-            List of search results.
+            Tuple of the ISBN13 values of the most similar books, most similar first,
+            and their cosine similarities to the query.
         """
-        if self.db is None:
+        if self.embeddings is None:
             raise ValueError("Vector database not created. Call create_vector_db() first.")
         
-        results = self.db.similarity_search(query, k=k)
-        return results
+        rows = np.flatnonzero(mask) if mask is not None else None
+        scores = self._score(self._embed_query(query), rows)
+        return self._top_k(scores, k, rows)
+    
+    def similarity_search_batch_with_scores(self,
+                                            queries: List[str],
+                                            k: int = 50,
+                                            mask: Optional[np.ndarray] = None) -> List[Tuple[List[int], List[float]]]:
+        """Perform similarity searches for several queries at once.
+        
+        The queries are embedded in a single API request and scored against the
+        stored books in one pass over the matrix.
+        
+        Args:
+            queries: The search queries.
+            k: Number of results to return per query.
+            mask: Optional boolean array selecting which stored books to search,
+                  see similarity_search().
+            
+        Returns:
+            One (ISBN13 values, similarities) tuple per query, as returned by
+            similarity_search_with_scores().
+        """
+        if self.embeddings is None:
+            raise ValueError("Vector database not created. Call create_vector_db() first.")
+        if not queries:
+            return []
+        
+        # (dim, num_queries) matrix of unit-length query embeddings
+        query_vectors = np.asarray(
+            self._get_embedding_model().embed_documents(list(queries)), dtype=np.float32
+        ).T
+        query_vectors /= np.linalg.norm(query_vectors, axis=0)
+        
+        rows = np.flatnonzero(mask) if mask is not None else None
+        scores = self._score(query_vectors, rows)
+        return [self._top_k(scores[:, i], k, rows) for i in range(len(queries))]
+    
+    def _top_k(self,
+               scores: np.ndarray,
+               k: int,
+               rows: Optional[np.ndarray] = None) -> Tuple[List[int], List[float]]:
+        """Pick the k best scored rows.
+        
+        Args:
+            scores: Score of each scored row.
+            k: Number of results to return.
+            rows: Positions of the scored rows, or None if every row was scored.
+            
+        Returns:
+            Tuple of the ISBN13 values of the best rows, best first, and their scores.
+        """
+        k = min(k, len(scores))
+        if k <= 0:
+            return [], []
+        
+        # Select the top k without sorting every score, then order just those k
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        
+        top_scores = scores[top].tolist()
+        if rows is not None:
+            top = rows[top]
+        return self.isbns[top].tolist(), top_scores
+    
+    def _score(self, query_vectors: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Compute the cosine similarity of normalised queries with the stored rows.
+        
+        Args:
+            query_vectors: Unit-length float32 query embedding, or a (dim, num_queries)
+                           matrix of them to score several queries at once.
+            rows: Positions of the rows to score. If None, scores every row.
+            
+        Returns:
+            float32 array with one score per scored row (and one column per query
+            when given a matrix).
+        """
+        matrix = self.embeddings if rows is None else self.embeddings[rows]
+        return matrix @ query_vectors
     
     def get_book_recommendations(self, 
                                 query: str, 
                                 books_df: pd.DataFrame, 
-                                k: int = 50) -> pd.DataFrame:
+                                k: int = 50,
+                                mask: Optional[np.ndarray] = None) -> pd.DataFrame:
         """Get book recommendations based on a semantic query.
         
         Args:
             query: The search query.
             books_df: DataFrame containing book data.
             k: Number of results to return.
+            mask: Optional boolean array selecting which stored books to search,
+                  see similarity_search().
             
         Returns:
-            DataFrame containing recommended books.
+            DataFrame containing recommended books, most similar first.
         """
-        if self.db is None:
+        if self.embeddings is None:
             raise ValueError("Vector database not created. Call create_vector_db() first.")
         
         # Perform similarity search
-        results = self.similarity_search(query, k=k)
-        
-        # Extract ISBN13 values from search results
-        isbn_list = [int(result.page_content.strip('"').split()[0]) for result in results]
+        isbn_list = self.similarity_search(query, k=k, mask=mask)
         
-        # Filter books DataFrame by ISBN13 values
-        recommendations = books_df[books_df["isbn13"].isin(isbn_list)].head(k)
+        # Gather the matching rows in ranking order with a single take, skipping ISBNs
+        # not in books_df (at most k ISBNs come back, so there is nothing to truncate)
+        rows = pd.Index(books_df["isbn13"]).get_indexer(isbn_list)
+        recommendations = books_df.take(rows[rows >= 0])
         
-        return recommendations
\ No newline at end of file
+        return recommendations
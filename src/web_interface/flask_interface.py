@@ -4,12 +4,49 @@ This module provides a Flask-based user interface for the book recommendation sy
 """
 
 import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
 from typing import List, Dict, Any, Optional, Tuple, Union
 
+import numpy as np
 import pandas as pd
 
-from src.vector_search.vector_search import VectorSearch
-from src.data.data_processor import DataProcessor
+from src.vector_search.vector_search import VectorSearch, top_k_positions
+from src.data.data_processor import DataProcessor, TONE_COLUMNS
+
+
+TONES = ["All", "Happy", "Surprising", "Angry", "Suspenseful", "Sad"]
+
+# Book columns used by the interface; the rest of the data file is not loaded
+WEB_COLUMNS = [
+    "isbn13", "title", "authors", "description", "thumbnail", "simple_categories",
+    "average_rating", "joy", "sadness", "anger", "fear", "surprise",
+]
+
+# Emotion scores included with each recommendation
+EMOTION_COLUMNS = ["joy", "sadness", "anger", "fear", "surprise"]
+
+# Columns that tones are ranked by, kept as float32 arrays for fast top-k selection
+TONE_EMOTIONS = sorted(set(TONE_COLUMNS.values()))
+
+# Recommendation fields and the column each one is read from
+RESULT_COLUMNS = {
+    "title": "title",
+    "authors_fmt": "authors",
+    "desc_trunc": "description",
+    "description": "full_description",
+    "large_thumbnail": "thumbnail",
+    "isbn13": "isbn13",
+    "simple_categories": "categories",
+    "average_rating": "rating",
+}
+
+# Number of (query, category, k) search results memoized
+SEARCH_CACHE_SIZE = 1024
+
+# Number of formatted (query, category, tone) responses memoized
+RESPONSE_CACHE_SIZE = 2048
 
 
 class FlaskInterface:
@@ -19,6 +56,33 @@ class FlaskInterface:
     user interface for the book recommendation system.
     """
     
+    # Shared instances by data path, see get_shared()
+    _shared: Dict[str, "FlaskInterface"] = {}
+    _shared_lock = threading.Lock()
+    
+    @classmethod
+    def get_shared(cls, data_path: Optional[str] = None) -> "FlaskInterface":
+        """Get the interface shared by every request and worker thread for a data path.
+        
+        The first call loads and warms up the book data and the vector database;
+        later calls return the same instance, so they are only loaded once per process.
+        
+        Args:
+            data_path: Path to the directory containing the data files.
+                       If None, uses the current working directory.
+            
+        Returns:
+            The shared, ready to use FlaskInterface.
+        """
+        data_path = data_path or os.getcwd()
+        with cls._shared_lock:
+            interface = cls._shared.get(data_path)
+            if interface is None:
+                interface = cls(data_path)
+                interface.warmup()
+                cls._shared[data_path] = interface
+        return interface
+    
     def __init__(self, data_path: Optional[str] = None):
         """Initialize the FlaskInterface.
         
@@ -30,16 +94,48 @@ class FlaskInterface:
         self.data_processor = DataProcessor(self.data_path)
         self.vector_search = VectorSearch(self.data_path)
         self.books_df = None
+        self._books_by_isbn = None  # books_df indexed by isbn13, for lookups by search result
+        self._emotion_arrays: Dict[str, np.ndarray] = {}  # tone columns of _books_by_isbn
+        self._category_codes: Dict[str, int] = {}  # categorical code of each category
+        self.categories: List[str] = ["All"]
+        self.tones: List[str] = TONES
+        # Boolean mask over the vector search rows for each category, built on first use
+        self._category_masks: Dict[str, np.ndarray] = {}
+        # Repeated searches reuse the ranked ISBNs instead of searching again
+        self._search_isbns = lru_cache(maxsize=SEARCH_CACHE_SIZE)(self._compute_search_isbns)
+        # Formatted results of get_recommendations(), most recently used last
+        self._response_cache: "OrderedDict[Tuple[str, str, str], List[Dict[str, Any]]]" = OrderedDict()
+        self._response_cache_lock = threading.Lock()
     
     def load_data(self, file_name: str = "books_with_emotions.csv") -> None:
         """Load book data from a CSV file.
         
+        The parsed data is cached as a memory-mapped Arrow IPC copy next to the CSV
+        (same name, .arrow extension), see DataProcessor.load_data().
+        
         Args:
             file_name: Name of the CSV file containing book data.
         """
-        file_path = os.path.join(self.data_path, file_name)
-        self.books_df = pd.read_csv(file_path)
+        self.books_df = self.data_processor.load_data(file_name, columns=WEB_COLUMNS)
         self.books_df = self.data_processor.prepare_for_web_display(self.books_df)
+        # Categories are compared by their integer code (a no-op if already categorical)
+        self.books_df["simple_categories"] = self.books_df["simple_categories"].astype("category")
+        self._category_codes = {
+            category: code
+            for code, category in enumerate(self.books_df["simple_categories"].cat.categories)
+        }
+        self._books_by_isbn = self.books_df.drop_duplicates("isbn13").set_index("isbn13", drop=False)
+        self._emotion_arrays = {
+            column: self._books_by_isbn[column].to_numpy(dtype=np.float32)
+            for column in TONE_EMOTIONS
+        }
+        
+        # Categories only change when the data is reloaded, so compute them once here
+        # instead of on every page render
+        self.categories = ["All"] + sorted(
+            self.books_df["simple_categories"].dropna().unique().tolist()
+        )
+        self._clear_caches()
     
     def initialize_vector_search(self, description_file: str = "tagged_description.txt") -> None:
         """Initialize the vector search database.
@@ -47,7 +143,95 @@ class FlaskInterface:
         Args:
             description_file: Name of the file containing tagged book descriptions.
         """
+        if self.vector_search.is_ready():
+            return
+        
         self.vector_search.create_vector_db(description_file)
+        self._clear_caches()
+    
+    def _clear_caches(self) -> None:
+        """Drop everything cached from the previously loaded data or vectors."""
+        self._category_masks = {}
+        self._search_isbns.cache_clear()
+        with self._response_cache_lock:
+            self._response_cache.clear()
+    
+    def warmup(self,
+               file_name: str = "books_with_emotions.csv",
+               description_file: str = "tagged_description.txt") -> None:
+        """Load everything a request needs ahead of time.
+        
+        Call this at process start (e.g. from a Gunicorn post_worker_init hook) so
+        the first request doesn't pay for loading the data, paging in the vector
+        database or building the category masks.
+        
+        Args:
+            file_name: Name of the CSV file containing book data.
+            description_file: Name of the file containing tagged book descriptions.
+        """
+        if self.books_df is None:
+            self.load_data(file_name)
+        self.initialize_vector_search(description_file)
+        self.vector_search.preload()
+        
+        for category in self.categories[1:]:
+            self._category_mask(category)
+    
+    def _category_mask(self, category: str) -> np.ndarray:
+        """Get the vector search rows whose book is in a category.
+        
+        Args:
+            category: Category to filter by.
+            
+        Returns:
+            Boolean array aligned with the vector search rows.
+        """
+        mask = self._category_masks.get(category)
+        if mask is None:
+            # Category of the book behind each vector search row (NaN for unknown ISBNs)
+            row_categories = self._books_by_isbn["simple_categories"].reindex(
+                self.vector_search.isbns
+            )
+            mask = self._category_code_mask(row_categories, category)
+            self._category_masks[category] = mask
+        return mask
+    
+    def _category_code_mask(self, categories: pd.Series, category: str) -> np.ndarray:
+        """Compare a categorical column with a category by integer code.
+        
+        Args:
+            categories: Categorical series sharing the categories of books_df.
+            category: Category to compare with.
+            
+        Returns:
+            Boolean array, True where the series holds category.
+        """
+        code = self._category_codes.get(category)
+        if code is None:
+            return np.zeros(len(categories), dtype=bool)
+        # Missing values have code -1, so they never match
+        return categories.cat.codes.to_numpy() == code
+    
+    def _compute_search_isbns(self,
+                              query: str,
+                              category: str,
+                              k: int) -> Tuple[Tuple[int, ...], Tuple[float, ...]]:
+        """Run the vector search for a query.
+        
+        Args:
+            query: The normalised search query.
+            category: Category to filter by.
+            k: Number of results to return.
+            
+        Returns:
+            Tuple of the ISBN13 values of the most similar books, most similar first,
+            and their similarity scores.
+        """
+        # Filter by category inside the vector search, so the top results are taken
+        # from the matching books only and the final list isn't left short
+        mask = self._category_mask(category) if category != "All" else None
+        isbns, scores = self.vector_search.similarity_search_with_scores(query, k=k, mask=mask)
+        return tuple(isbns), tuple(scores)
     
     def retrieve_recommendations(self,
                                query: str,
@@ -70,25 +254,81 @@ class FlaskInterface:
         if self.books_df is None:
             raise ValueError("No data loaded. Call load_data() first.")
         
-        # Get recommendations from vector search
-        recommendations = self.vector_search.get_book_recommendations(
-            query, self.books_df, k=initial_top_k
-        )
+        # An empty query has nothing to search for, so skip embedding it
+        query_key = (query or "").strip().lower()
+        if not query_key:
+            return self._category_head(category, tone, final_top_k)
         
-        # Filter by category
-        if category != "All":
-            recommendations = self.data_processor.filter_by_category(
-                category, recommendations
-            ).head(final_top_k)
-        else:
-            recommendations = recommendations.head(final_top_k)
+        # Get recommendations from vector search. Only the ISBNs are cached, keyed on
+        # the normalised query, and the rows are looked up by ISBN on every request
+        isbns, scores = self._search_isbns(query_key, category, initial_top_k)
+        return self._rank_candidates(isbns, scores, tone, final_top_k)
+    
+    def _category_head(self, category: str, tone: str, final_top_k: int) -> pd.DataFrame:
+        """Get the top books of a category, used when there is no query.
         
-        # Sort by emotion
-        if tone != "All":
-            recommendations = self.data_processor.sort_by_emotion(
-                tone, recommendations
-            )
+        With a tone, these are the books of the category scoring highest for the
+        tone's emotion; otherwise the first books of the category.
         
+        Args:
+            category: Category to filter by.
+            tone: Emotional tone to sort by.
+            final_top_k: Number of books to return.
+            
+        Returns:
+            DataFrame containing the books.
+        """
+        tone_column = TONE_COLUMNS.get(tone)
+        if tone_column is not None:
+            # Rank the whole category on the emotion arrays, which are aligned with
+            # _books_by_isbn, and take just the selected rows
+            if category == "All":
+                rows = np.arange(len(self._books_by_isbn))
+            else:
+                rows = np.flatnonzero(
+                    self._category_code_mask(self._books_by_isbn["simple_categories"], category)
+                )
+            top = top_k_positions(self._emotion_arrays[tone_column][rows], final_top_k)
+            return self._books_by_isbn.take(rows[top])
+        
+        if category == "All":
+            return self.books_df.head(final_top_k)
+        # Select by position so the frame is copied once, by take
+        in_category = self._category_code_mask(self.books_df["simple_categories"], category)
+        return self.books_df.take(np.flatnonzero(in_category)[:final_top_k])
+    
+    def _rank_candidates(self,
+                         isbns: Tuple[int, ...],
+                         scores: Tuple[float, ...],
+                         tone: str,
+                         final_top_k: int) -> pd.DataFrame:
+        """Turn vector search hits into the final recommendations.
+        
+        Args:
+            isbns: ISBN13 values of the candidate books, most similar first.
+            scores: Similarity score of each candidate.
+            tone: Emotional tone to sort by.
+            final_top_k: Number of books to return.
+            
+        Returns:
+            DataFrame containing the recommended books and their score.
+        """
+        rows = self._books_by_isbn.index.get_indexer(isbns)
+        found = rows >= 0  # skip ISBNs missing from books_df
+        rows, scores = rows[found], np.asarray(scores)[found]
+        
+        # Rank all the candidates by the tone's emotion, not just the first final_top_k,
+        # on the precomputed emotion arrays; ties keep their similarity order
+        tone_column = TONE_COLUMNS.get(tone)
+        if tone_column is not None:
+            top = top_k_positions(self._emotion_arrays[tone_column][rows], final_top_k)
+        else:
+            top = slice(0, final_top_k)
+        
+        # Work on positions up to here so the frame is only copied once, by take;
+        # adding the score column to that fresh frame doesn't copy it again
+        recommendations = self._books_by_isbn.take(rows[top])
+        recommendations["score"] = scores[top]
         return recommendations
     
     def format_recommendations(self, recommendations: pd.DataFrame) -> List[Dict[str, Any]]:
@@ -100,51 +340,101 @@ class FlaskInterface:
         Returns:
             List of dictionaries containing book information.
         """
-        results = []
+        # Format author strings and truncate descriptions for all rows at once
+        recommendations = recommendations.assign(
+            authors_fmt=self.data_processor.format_author_series(recommendations["authors"]),
+            desc_trunc=self.data_processor.truncate_description_series(
+                recommendations["description"], max_words=30
+            ),
+        )
         
-        for _, row in recommendations.iterrows():
-            # Format author string
-            authors_str = self.data_processor.format_author_string(row["authors"])
-            
-            # Truncate description
-            truncated_description = self.data_processor.truncate_description(
-                row["description"], max_words=30
-            )
-            
-            # Create book info dictionary
-            book_info = {
-                "title": row["title"],
-                "authors": authors_str,
-                "description": truncated_description,
-                "full_description": row["description"],
-                "thumbnail": row["large_thumbnail"],
-                "isbn13": row["isbn13"],
-                "categories": row["simple_categories"],
-                "rating": row["average_rating"] if "average_rating" in row else None,
-                "emotions": {
-                    "joy": float(row["joy"]) if "joy" in row else 0,
-                    "sadness": float(row["sadness"]) if "sadness" in row else 0,
-                    "anger": float(row["anger"]) if "anger" in row else 0,
-                    "fear": float(row["fear"]) if "fear" in row else 0,
-                    "surprise": float(row["surprise"]) if "surprise" in row else 0
-                }
-            }
-            
-            # Add to results
-            results.append(book_info)
+        # Build the book dictionaries and their emotion sub-dictionaries in pandas
+        # rather than field by field in Python
+        results = (
+            recommendations[list(RESULT_COLUMNS)]
+            .rename(columns=RESULT_COLUMNS)
+            .to_dict("records")
+        )
+        # to_dict hands the float32 emotion scores back as plain Python floats
+        emotions = recommendations[EMOTION_COLUMNS].to_dict("records")
+        for book_info, book_emotions in zip(results, emotions):
+            book_info["emotions"] = book_emotions
         
         return results
     
     def get_recommendations(self, query: str, category: str, tone: str) -> List[Dict[str, Any]]:
         """Get and format book recommendations.
         
+        Results are cached by normalised query, category and tone until the data is
+        reloaded, so repeated requests skip both the search and the formatting.
+        
         Args:
             query: The search query.
             category: Category to filter by.
             tone: Emotional tone to sort by.
             
         Returns:
-            List of dictionaries containing book information.
+            List of dictionaries containing book information. Cached lists are
+            shared between calls and must not be modified.
         """
+        key = ((query or "").strip().lower(), category, tone)
+        with self._response_cache_lock:
+            results = self._response_cache.get(key)
+            if results is not None:
+                self._response_cache.move_to_end(key)
+                return results
+        
         recommendations = self.retrieve_recommendations(query, category, tone)
-        return self.format_recommendations(recommendations)
\ No newline at end of file
+        results = self.format_recommendations(recommendations)
+        
+        with self._response_cache_lock:
+            self._response_cache[key] = results
+            self._response_cache.move_to_end(key)
+            if len(self._response_cache) > RESPONSE_CACHE_SIZE:
+                self._response_cache.popitem(last=False)
+        return results
+    
+    def get_recommendations_batch(self,
+                                  queries: List[str],
+                                  category: str = "All",
+                                  tone: str = "All",
+                                  initial_top_k: int = 50,
+                                  final_top_k: int = 16) -> List[List[Dict[str, Any]]]:
+        """Get and format book recommendations for several queries at once.
+        
+        Repeated queries are searched once, and all distinct queries are embedded
+        and searched together, which costs about as much as a single query.
+        
+        Args:
+            queries: The search queries.
+            category: Category to filter by.
+            tone: Emotional tone to sort by.
+            initial_top_k: Initial number of results to retrieve per query.
+            final_top_k: Final number of results to return per query.
+            
+        Returns:
+            One list of book dictionaries per query, in the order of queries.
+        """
+        if self.books_df is None:
+            raise ValueError("No data loaded. Call load_data() first.")
+        
+        query_keys = [(query or "").strip().lower() for query in queries]
+        unique_keys = [key for key in dict.fromkeys(query_keys) if key]
+        
+        # A batch of only empty queries needs no search at all
+        hits = {}
+        if unique_keys:
+            mask = self._category_mask(category) if category != "All" else None
+            hits = dict(zip(unique_keys, self.vector_search.similarity_search_batch_with_scores(
+                unique_keys, k=initial_top_k, mask=mask
+            )))
+        
+        formatted = {}
+        for key in dict.fromkeys(query_keys):
+            if key:
+                recommendations = self._rank_candidates(*hits[key], tone, final_top_k)
+            else:
+                recommendations = self._category_head(category, tone, final_top_k)
+            formatted[key] = self.format_recommendations(recommendations)
+        
+        return [formatted[key] for key in query_keys]
\ No newline at end of file